@@ -27,6 +27,12 @@ class XUConnector(Connector):
         self.client = xudataiku.rest.Client(extraction.get("xuServerPreset"))
         self.extraction_name = extraction.get("extractionName")
         self.parameters = config.get("parameters")
+        self.result_cache_config = {
+            "resultCacheEnabled": config.get("resultCacheEnabled"),
+            "resultCacheTimeToLiveHours": config.get("resultCacheTimeToLiveHours"),
+            "resultCacheMaxSizeMb": config.get("resultCacheMaxSizeMb"),
+            "resultCacheDirectory": config.get("resultCacheDirectory"),
+        }
 
     def get_read_schema(self):
         """
@@ -60,7 +66,8 @@ class XUConnector(Connector):
         The dataset schema and partitioning are given for information purpose.
         """
 
-        return self.client.run_extraction(self.extraction_name, self.parameters, dataset_schema, records_limit)
+        return self.client.run_extraction(
+            self.extraction_name, self.parameters, dataset_schema, records_limit, self.result_cache_config)
 
     def get_writer(self, dataset_schema=None, dataset_partitioning=None, partition_id=None):
         """
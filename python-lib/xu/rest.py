@@ -4,10 +4,11 @@ from dataclasses import dataclass
 from http.client import HTTPResponse
 from io import TextIOWrapper
 
-from typing import Callable, List, Dict, MutableMapping
+from typing import Callable, List, Dict, MutableMapping, Optional
 from urllib.parse import urlencode
 
 from xu.parameterization import RunParameter, RunParameterCollection
+from xu.result_cache import ResultCache
 from xu.result_table import ResultColumn
 
 
@@ -24,6 +25,9 @@ class _URLBuilder:
         object.__setattr__(self, "_root", root)
         object.__setattr__(self, "_metadata_root", metadata_root)
 
+    def get_server(self) -> str:
+        return self._root
+
     def get_extractions(self, destination_type: str) -> str:
         return f"{self._metadata_root}?destinationType={destination_type}"
 
@@ -54,8 +58,13 @@ class _URLBuilder:
 
         return urlencode(url_params)
 
+    @staticmethod
+    def normalize_parameters(parameters: Dict[str, str]) -> Dict[str, str]:
+        # Equal parameter sets must produce the same URL, regardless of the order they were specified in.
+        return {str(name): str(value) for name, value in sorted(parameters.items(), key=lambda p: str(p[0]))}
+
     def get_run(self, extraction_name: str, parameters: Dict[str, str]) -> str:
-        query_string = urlencode(parameters)
+        query_string = urlencode(self.normalize_parameters(parameters))
         url = f"{self._root}/run/{extraction_name}"
         if 0 < len(query_string):
             url += f"?{query_string}"
@@ -124,47 +133,52 @@ class Client:
 
             return names
 
-    def get_result_columns(self, extraction: str) -> List[ResultColumn]:
-        self._log_info("===== XtractRequestHandler.load_extraction_metadata started =====")
-        try:
-            import ssl
-            # Connect to the server
-            server_url = self._url_builder.get_result_columns(extraction)
+    def _load_result_columns(self, extraction: str) -> Optional[List[ResultColumn]]:
+        # Connect to the server
+        server_url = self._url_builder.get_result_columns(extraction)
 
-            self._log_info(f"Loading result columns from {server_url}")
-            response: HTTPResponse = self._execute_web_request(server_url)
+        self._log_info(f"Loading result columns from {server_url}")
+        response: HTTPResponse = self._execute_web_request(server_url)
 
-            self._log_info(f"Result columns request finished")
+        self._log_info(f"Result columns request finished")
 
-            # Check if the request was successful (status code 200)
-            if response.status == 200:
-                try:
-                    # Parse the JSON data from the response content
-                    content = response.read().decode('utf-8')
-                    # self._log_info(f"Columns content: '${content}'")
-                    json_data = json.loads(content)
+        # Check if the request was successful (status code 200)
+        if response.status != 200:
+            self._log_warning(f"Server returned status code {response.status}")
+            return None
 
-                    # Access the list of column dictionaries under the "columns" key
-                    columns_data: [ResultColumn] = []
+        # Parse the JSON data from the response content
+        content = response.read().decode('utf-8')
+        # self._log_info(f"Columns content: '${content}'")
+        json_data = json.loads(content)
 
-                    for xtract_result_column in json_data.get("columns", []):
-                        columns_data.append(
-                            ResultColumn(
-                                name=xtract_result_column.get("name"),
-                                description=xtract_result_column.get("description"),
-                                result_type=xtract_result_column.get("type"),
-                                length=xtract_result_column.get("length"),
-                                decimal_count=xtract_result_column.get("decimalsCount"),
-                                is_primary_key=xtract_result_column.get("isPrimaryKey")))
-                        # self._log_info(columns_data[-1].to_log_string())
+        # Access the list of column dictionaries under the "columns" key
+        columns_data: [ResultColumn] = []
 
-                    return columns_data
+        for xtract_result_column in json_data.get("columns", []):
+            columns_data.append(
+                ResultColumn(
+                    name=xtract_result_column.get("name"),
+                    description=xtract_result_column.get("description"),
+                    result_type=xtract_result_column.get("type"),
+                    length=xtract_result_column.get("length"),
+                    decimal_count=xtract_result_column.get("decimalsCount"),
+                    is_primary_key=xtract_result_column.get("isPrimaryKey")))
+            # self._log_info(columns_data[-1].to_log_string())
 
-                except json.JSONDecodeError as json_error:
-                    self._log_error(f"Error parsing JSON: {json_error}")
-                    raise json_error
-            else:
-                self._log_warning(f"Server returned status code {response.status}")
+        return columns_data
+
+    def get_result_columns(self, extraction: str) -> List[ResultColumn]:
+        self._log_info("===== XtractRequestHandler.load_extraction_metadata started =====")
+        try:
+            try:
+                columns_data = self._load_result_columns(extraction)
+            except json.JSONDecodeError as json_error:
+                self._log_error(f"Error parsing JSON: {json_error}")
+                raise json_error
+
+            if columns_data is not None:
+                return columns_data
         except Exception as ex:
             self._log_error(f"Error occured during metadata load: {repr(ex)}")
             raise ex
@@ -231,13 +245,84 @@ class Client:
             for line in lines:
                 yield line.split("\x1f")
 
+    def _get_result_cache_key(self, extraction: str, parameters: Dict[str, str]) -> Optional[str]:
+        # The result columns are only needed for the cache, so failing to load them must not fail the extraction.
+        try:
+            result_columns = self._load_result_columns(extraction)
+        except Exception as ex:
+            self._log_warning(f"Loading result columns failed: {repr(ex)}")
+            return None
+        if result_columns is None:
+            return None
+
+        return ResultCache.get_key(
+            f"{self._user}@{self._url_builder.get_server()}",
+            extraction,
+            self._url_builder.normalize_parameters(parameters),
+            result_columns)
+
+    def _open_result_cache(self, result_cache: ResultCache, result_cache_key: str):
+        try:
+            return result_cache.open(result_cache_key)
+        except OSError as ex:
+            self._log_warning(f"Reading from result cache failed, continuing without cache: {repr(ex)}")
+            return None
+
+    @staticmethod
+    def _parse_cached_csv(cached_payload, read_buffer_size):
+        try:
+            yield from Client._parse_csv(cached_payload, read_buffer_size)
+        finally:
+            cached_payload.close()
+
+    def _parse_and_cache_csv(self, response, read_buffer_size, result_cache: ResultCache, result_cache_key: str):
+        try:
+            writer = result_cache.create_writer(result_cache_key)
+        except OSError as ex:
+            self._log_warning(f"Creating result cache entry failed, continuing without cache: {repr(ex)}")
+            yield from self._parse_csv(response, read_buffer_size)
+            return
+
+        try:
+            caching_reader = result_cache.create_caching_reader(response, writer, self._log_warning)
+            yield from self._parse_csv(caching_reader, read_buffer_size)
+
+            # Only complete payloads are stored, i.e. the consumer has read all rows.
+            if not writer.is_discarded():
+                try:
+                    writer.commit()
+                    self._log_info(f"Stored extraction result in cache")
+                except OSError as ex:
+                    self._log_warning(f"Storing result cache entry failed: {repr(ex)}")
+        finally:
+            writer.close()
+
+        try:
+            result_cache.evict()
+        except OSError as ex:
+            self._log_warning(f"Result cache eviction failed: {repr(ex)}")
+
     def run_extraction(
             self,
             extraction: str,
             parameters: Dict[str, str],
-            read_buffer_size=0x2000):
+            read_buffer_size=0x2000,
+            result_cache: Optional[ResultCache] = None):
         self._log_info("===== XtractRequestHandler.run_extraction started =====")
         try:
+            result_cache_key = None
+            if result_cache is not None:
+                result_cache_key = self._get_result_cache_key(extraction, parameters)
+                if result_cache_key is None:
+                    self._log_warning(f"Result columns unavailable, continuing without cache")
+                    result_cache = None
+
+            if result_cache is not None:
+                cached_payload = self._open_result_cache(result_cache, result_cache_key)
+                if cached_payload is not None:
+                    self._log_info(f"Reading extraction result from cache")
+                    return self._parse_cached_csv(cached_payload, read_buffer_size)
+
             server_url = self._url_builder.get_run(extraction, parameters)
 
             self._log_info(f"starting extraction {server_url}")
@@ -245,6 +330,9 @@ class Client:
             self._log_info(f"Start extraction request finished")
 
             if response.status == 200:
+                if result_cache is not None:
+                    return self._parse_and_cache_csv(response, read_buffer_size, result_cache, result_cache_key)
+
                 return self._parse_csv(response, read_buffer_size)
             else:
                 raise RuntimeError(f"Response had status code {response.status}")
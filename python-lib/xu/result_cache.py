@@ -0,0 +1,226 @@
+﻿import gzip
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass
+from io import BufferedReader, RawIOBase
+from typing import BinaryIO, Callable, Dict, List, Optional
+
+from xu.result_table import ResultColumn
+
+# Temporary files of runs that died without cleaning up, e.g. killed jobs.
+# Active runs keep updating the modification time while the payload is streamed.
+_STALE_TEMP_FILE_SECONDS = 24 * 3600
+
+_VERIFY_BUFFER_SIZE = 0x10000
+
+
+def make_private_directory(path: str) -> None:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    if not hasattr(os, "getuid"):
+        return
+
+    # Cached payloads contain SAP data, so the directory must not be shared with or controlled by other users.
+    directory_stat = os.lstat(path)
+    if (not stat.S_ISDIR(directory_stat.st_mode)
+            or directory_stat.st_uid != os.getuid()
+            or directory_stat.st_mode & 0o077):
+        raise PermissionError(f"Result cache directory '{path}' must be a directory with mode 0700 "
+                              f"owned by the current user")
+
+
+class ResultCacheWriter:
+    _path: str
+    _temp_path: str
+    _file: gzip.GzipFile
+    _committed: bool
+    _discarded: bool
+
+    def __init__(self, directory: str, path: str) -> None:
+        self._path = path
+        self._committed = False
+        self._discarded = False
+
+        # Write to a temporary file first, so that readers never see partially written entries.
+        file_descriptor, self._temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        self._file = gzip.GzipFile(fileobj=os.fdopen(file_descriptor, "wb"), mode="wb")
+
+    def is_discarded(self) -> bool:
+        return self._discarded
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def commit(self) -> None:
+        self._close_file()
+        os.replace(self._temp_path, self._path)
+        os.utime(self._path)
+        self._committed = True
+
+    def close(self) -> None:
+        # Entries that have not been committed are incomplete, e.g. because the consumer stopped reading.
+        if self._committed or self._discarded:
+            return
+
+        self._discarded = True
+        try:
+            self._close_file()
+        except OSError:
+            pass
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+    def _close_file(self) -> None:
+        if self._file.closed:
+            return
+
+        file_object = self._file.fileobj
+        try:
+            self._file.close()
+        finally:
+            file_object.close()
+
+
+class _CachingReader(RawIOBase):
+    _source: BinaryIO
+    _writer: ResultCacheWriter
+    _log_warning: Callable[[str], None]
+
+    def __init__(self, source: BinaryIO, writer: ResultCacheWriter, log_warning: Callable[[str], None]) -> None:
+        super().__init__()
+        self._source = source
+        self._writer = writer
+        self._log_warning = log_warning
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._source.read(len(buffer))
+        read_count = len(data)
+        buffer[:read_count] = data
+        if 0 < read_count and not self._writer.is_discarded():
+            try:
+                self._writer.write(data)
+            except OSError as error:
+                # A failing cache must not break the extraction, keep passing the payload through.
+                self._log_warning(f"Writing to result cache failed, continuing without cache: {repr(error)}")
+                self._writer.close()
+
+        return read_count
+
+
+@dataclass(frozen=True)
+class ResultCache:
+    _directory: str
+    _time_to_live_seconds: float
+    _max_size_bytes: int
+
+    def __init__(self, directory: str, time_to_live_seconds: float, max_size_bytes: int) -> None:
+        object.__setattr__(self, "_directory", directory)
+        object.__setattr__(self, "_time_to_live_seconds", time_to_live_seconds)
+        object.__setattr__(self, "_max_size_bytes", max_size_bytes)
+
+        make_private_directory(directory)
+
+    @staticmethod
+    def get_key(server: str,
+                extraction: str,
+                parameters: Dict[str, str],
+                result_columns: List[ResultColumn]) -> str:
+        key_data = {
+            "server": server,
+            "extraction": extraction,
+            "parameters": parameters,
+            "columns": [[column.name, column.result_type, column.length, column.decimal_count]
+                        for column in result_columns]
+        }
+
+        key_json = json.dumps(key_data, sort_keys=True)
+        return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self._directory, f"{key}.gz")
+
+    def _is_expired(self, modified_time: float, now: float) -> bool:
+        return 0 < self._time_to_live_seconds and self._time_to_live_seconds < now - modified_time
+
+    @staticmethod
+    def _is_valid(path: str) -> bool:
+        # Reading to the end checks the CRC and length stored in the gzip trailer.
+        # Entries must be verified before replay, because rows cannot be taken back once yielded.
+        try:
+            with gzip.open(path, "rb") as cached_payload:
+                while cached_payload.read(_VERIFY_BUFFER_SIZE):
+                    pass
+            return True
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return False
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        path = self._get_path(key)
+        now = time.time()
+        try:
+            modified_time = os.stat(path).st_mtime
+            if self._is_expired(modified_time, now) or not self._is_valid(path):
+                os.remove(path)
+                return None
+
+            # The modification time marks the creation of the entry, the access time is used for LRU eviction.
+            os.utime(path, (now, modified_time))
+            return gzip.open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+    def create_writer(self, key: str) -> ResultCacheWriter:
+        return ResultCacheWriter(self._directory, self._get_path(key))
+
+    def create_caching_reader(self,
+                              source: BinaryIO,
+                              writer: ResultCacheWriter,
+                              log_warning: Callable[[str], None]) -> BinaryIO:
+        return BufferedReader(_CachingReader(source, writer, log_warning))
+
+    def evict(self) -> None:
+        now = time.time()
+        entries = []
+        with os.scandir(self._directory) as directory_entries:
+            for directory_entry in directory_entries:
+                try:
+                    if directory_entry.name.endswith(".tmp"):
+                        if _STALE_TEMP_FILE_SECONDS < now - directory_entry.stat().st_mtime:
+                            os.remove(directory_entry.path)
+                        continue
+
+                    if not directory_entry.name.endswith(".gz"):
+                        continue
+
+                    entry_stat = directory_entry.stat()
+                    if self._is_expired(entry_stat.st_mtime, now):
+                        os.remove(directory_entry.path)
+                    else:
+                        entries.append((entry_stat.st_atime, entry_stat.st_size, directory_entry.path))
+                except FileNotFoundError:
+                    # Removed concurrently by another run.
+                    pass
+
+        if self._max_size_bytes <= 0:
+            return
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self._max_size_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
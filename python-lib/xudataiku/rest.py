@@ -1,12 +1,17 @@
-﻿from dataclasses import dataclass
+﻿import os
+import re
+import tempfile
+from dataclasses import dataclass
 from typing import Dict
 
 import xu.rest
+import xu.result_cache
 
 
 @dataclass(frozen=True)
 class Client:
     _xu_server_preset: dict
+    _xu_server: str
     _xu_client: xu.rest.Client
     _dataiku_types: Dict[str, str]
     _dataiku_meanings: Dict[str, str]
@@ -32,6 +37,7 @@ class Client:
         password = xu_server_preset.get("password")
 
         object.__setattr__(self, "_xu_server_preset", xu_server_preset)
+        object.__setattr__(self, "_xu_server", f"{host}_{port}")
         object.__setattr__(self, "_xu_client", xu.rest.Client(
             host, port, tls_enabled, user, password, self._log_info, self._log_warn, self._log_err))
 
@@ -123,7 +129,36 @@ class Client:
 
         return {"choices": choices}
 
-    def run_extraction(self, name, dataiku_parameters, dataset_schema, records_limit):
+    @staticmethod
+    def _get_default_result_cache_directory():
+        dip_home = os.environ.get("DIP_HOME")
+        if dip_home:
+            directory = os.path.join(dip_home, "tmp", "xtract-universal-result-cache")
+        else:
+            user_id = os.getuid() if hasattr(os, "getuid") else os.getlogin()
+            directory = os.path.join(tempfile.gettempdir(), f"xtract-universal-result-cache-{user_id}")
+
+        xu.result_cache.make_private_directory(directory)
+        return directory
+
+    def _create_result_cache(self, extraction_name, result_cache_config):
+        if not result_cache_config or not result_cache_config.get("resultCacheEnabled"):
+            return None
+
+        time_to_live_hours = result_cache_config.get("resultCacheTimeToLiveHours") or 0
+        max_size_mb = result_cache_config.get("resultCacheMaxSizeMb") or 0
+        try:
+            directory = result_cache_config.get("resultCacheDirectory") or self._get_default_result_cache_directory()
+            # Limits apply per extraction and server, datasets sharing both also share the cached results.
+            directory = os.path.join(
+                directory, re.sub(r"[^A-Za-z0-9_.-]", "_", f"{self._xu_server}_{extraction_name}"))
+
+            return xu.result_cache.ResultCache(directory, time_to_live_hours * 3600, max_size_mb * 1024 * 1024)
+        except OSError as ex:
+            self._log_warn(f"Result cache unavailable, continuing without cache: {repr(ex)}")
+            return None
+
+    def run_extraction(self, name, dataiku_parameters, dataset_schema, records_limit, result_cache_config=None):
         # print("dataset_schema", dataset_schema)
 
         column_names = list(map(lambda column: column.get("name"), dataset_schema.get("columns")))
@@ -136,7 +171,10 @@ class Client:
         if is_preview:
             parameters["preview"] = "true"
 
-        csv_rows = self._xu_client.run_extraction(name, parameters)
+        # Previews are read partially, so there is no complete payload to cache.
+        result_cache = None if is_preview else self._create_result_cache(name, result_cache_config)
+
+        csv_rows = self._xu_client.run_extraction(name, parameters, result_cache=result_cache)
         columns_count = len(column_names)
         records_count = 0
         for values in csv_rows:
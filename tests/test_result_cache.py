@@ -0,0 +1,177 @@
+import gzip
+import json
+import os
+import time
+import urllib.request
+from http.client import IncompleteRead
+from io import BytesIO
+
+import pytest
+
+import xu.rest
+from xu.result_cache import ResultCache, make_private_directory
+
+ROWS_COUNT = 5000
+PAYLOAD = "".join(f"a{i}\x1fb{i}\x1e" for i in range(ROWS_COUNT)).encode()
+COLUMNS = {"columns": [
+    {"name": "A", "type": "StringLengthMax", "length": 10, "decimalsCount": 0},
+    {"name": "B", "type": "StringLengthMax", "length": 10, "decimalsCount": 0},
+]}
+
+
+class FakeResponse(BytesIO):
+    def __init__(self, content: bytes, status: int = 200) -> None:
+        super().__init__(content)
+        self.status = status
+
+
+class FakeServer:
+    def __init__(self) -> None:
+        self.urls = []
+        self.result_columns_error = None
+
+    def urlopen(self, request):
+        url = request.full_url
+        self.urls.append(url)
+        if "/run/" in url:
+            return FakeResponse(PAYLOAD)
+        if self.result_columns_error is not None:
+            raise self.result_columns_error
+        return FakeResponse(json.dumps(COLUMNS).encode())
+
+    def get_run_count(self) -> int:
+        return len([url for url in self.urls if "/run/" in url])
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake_server = FakeServer()
+    monkeypatch.setattr(urllib.request, "urlopen", fake_server.urlopen)
+    return fake_server
+
+
+@pytest.fixture
+def client():
+    return xu.rest.Client("localhost", 8065, False, None, None, print, print, print)
+
+
+@pytest.fixture
+def result_cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), 3600, 0)
+
+
+def get_entries(result_cache_directory):
+    return sorted(name for name in os.listdir(result_cache_directory) if name.endswith(".gz"))
+
+
+def test_hit_replays_identical_rows_without_run(server, client, result_cache, tmp_path):
+    miss_rows = list(client.run_extraction("ex", {"b": "2", "a": "1"}, result_cache=result_cache))
+    hit_rows = list(client.run_extraction("ex", {"a": "1", "b": "2"}, result_cache=result_cache))
+
+    assert ROWS_COUNT == len(miss_rows)
+    assert miss_rows == hit_rows
+    assert 1 == server.get_run_count()
+    assert 1 == len(get_entries(tmp_path / "cache"))
+
+
+def test_closed_generator_leaves_no_entry(server, client, result_cache, tmp_path):
+    rows = client.run_extraction("ex", {}, result_cache=result_cache)
+    next(rows)
+    rows.close()
+
+    assert [] == os.listdir(tmp_path / "cache")
+
+
+def test_truncated_entry_falls_back_to_run(server, client, result_cache, tmp_path):
+    list(client.run_extraction("ex", {}, result_cache=result_cache))
+    entry_path = tmp_path / "cache" / get_entries(tmp_path / "cache")[0]
+    entry_content = entry_path.read_bytes()
+    entry_path.write_bytes(entry_content[:len(entry_content) // 2])
+
+    rows = list(client.run_extraction("ex", {}, result_cache=result_cache))
+
+    assert ROWS_COUNT == len(rows)
+    assert 2 == server.get_run_count()
+    # The corrupt entry has been replaced by the payload of the fallback run.
+    with gzip.open(entry_path, "rb") as cached_payload:
+        assert PAYLOAD == cached_payload.read()
+
+
+def test_result_columns_failure_skips_cache(server, client, result_cache, tmp_path):
+    server.result_columns_error = IncompleteRead(b"")
+
+    rows = list(client.run_extraction("ex", {}, result_cache=result_cache))
+
+    assert ROWS_COUNT == len(rows)
+    assert [] == os.listdir(tmp_path / "cache")
+
+
+def store_entry(result_cache, key, content: bytes) -> None:
+    writer = result_cache.create_writer(key)
+    writer.write(content)
+    writer.commit()
+
+
+def test_expired_entry_is_evicted(tmp_path):
+    result_cache = ResultCache(str(tmp_path), 3600, 0)
+    store_entry(result_cache, "expired", b"x")
+    store_entry(result_cache, "fresh", b"x")
+    created_time = time.time() - 7200
+    os.utime(tmp_path / "expired.gz", (created_time, created_time))
+
+    assert result_cache.open("expired") is None
+    store_entry(result_cache, "expired", b"x")
+    os.utime(tmp_path / "expired.gz", (created_time, created_time))
+    result_cache.evict()
+
+    assert ["fresh.gz"] == get_entries(tmp_path)
+
+
+def test_size_limit_evicts_least_recently_read_entry(tmp_path):
+    content = os.urandom(1000)
+    result_cache = ResultCache(str(tmp_path), 0, 2500)
+    for key in ["first", "second", "third"]:
+        store_entry(result_cache, key, content)
+
+    now = time.time()
+    os.utime(tmp_path / "first.gz", (now - 300, now - 300))
+    os.utime(tmp_path / "second.gz", (now - 200, now - 200))
+    os.utime(tmp_path / "third.gz", (now - 100, now - 100))
+    # Reading the oldest entry makes it the most recently used one.
+    result_cache.open("first").close()
+    result_cache.evict()
+
+    assert ["first.gz", "third.gz"] == get_entries(tmp_path)
+
+
+def test_stale_temp_files_are_evicted(tmp_path):
+    result_cache = ResultCache(str(tmp_path), 0, 0)
+    stale_path = tmp_path / "stale.tmp"
+    active_path = tmp_path / "active.tmp"
+    stale_path.write_bytes(b"x")
+    active_path.write_bytes(b"x")
+    os.utime(stale_path, (0, 0))
+
+    result_cache.evict()
+
+    assert ["active.tmp"] == os.listdir(tmp_path)
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions only")
+def test_make_private_directory_rejects_shared_directory(tmp_path):
+    directory = tmp_path / "shared"
+    directory.mkdir()
+    os.chmod(directory, 0o755)
+
+    with pytest.raises(PermissionError):
+        make_private_directory(str(directory))
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions only")
+def test_make_private_directory_rejects_foreign_owner(tmp_path, monkeypatch):
+    directory = tmp_path / "foreign"
+    make_private_directory(str(directory))
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(directory).st_uid + 1)
+
+    with pytest.raises(PermissionError):
+        make_private_directory(str(directory))